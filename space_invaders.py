@@ -1,15 +1,57 @@
+import time
+
+# Taken before the pygame import so the startup report covers the whole cold start
+IMPORT_START = time.perf_counter()
+
+import argparse
+import functools
+import math
 import random
 import sys
+from collections import namedtuple
 
 import pygame
 
-# Initialize Pygame
-pygame.init()
+try:
+    import numpy as np
+except ImportError:  # Optional: only the NumPy formation backend needs it
+    np = None
 
-# Get screen resolution
-info = pygame.display.Info()
-WIDTH, HEIGHT = info.current_w, info.current_h
+# Simulation rate; rendering runs as fast as the display allows, capped at
+# MAX_RENDER_FPS (0 for no cap), and interpolates between simulation ticks
 FPS = 60
+FRAME_MS = 1000 / FPS
+MAX_RENDER_FPS = 240
+# Most simulation ticks run per rendered frame; older time is dropped so a
+# long stall cannot snowball into ever longer catch-up frames
+MAX_CATCHUP_STEPS = 5
+# Idle-time work stops this long before the frame budget runs out, leaving
+# room for the step in progress to finish
+IDLE_MARGIN_MS = 0.5
+# Bullets are preallocated; shots beyond this many live bullets are dropped
+BULLET_POOL_SIZE = 64
+# Player bullets in flight at once; the pool keeps this many slots for them
+PLAYER_MAX_BULLETS = 3
+
+# Alien fire pattern per shooter: straight down, aimed at the player or a fan
+# of SPREAD_COUNT bullets over SPREAD_ARC radians. Only the NumPy bullet
+# engine supports angled shots; sprite bullets always fly straight
+BULLET_PATTERNS = ("single", "aimed", "spread")
+BULLET_PATTERN = "single"
+SPREAD_COUNT = 5
+SPREAD_ARC = 0.8
+
+# How aliens pick their shooter: the lowest alien of a random column, of the
+# column nearest the player, or of a column weighted by how many aliens it holds
+ALIEN_SHOT_MODES = ("random", "aimed", "weighted")
+ALIEN_SHOT_MODE = "random"
+
+# Redraw only changed screen regions; switch to False for full-screen redraws
+USE_DIRTY_RENDERER = True
+# Fraction of the screen that may be dirty before falling back to a full flip
+DIRTY_FALLBACK_RATIO = 0.4
+# Draw HUD text from a pre-rendered glyph atlas instead of rendering strings
+USE_GLYPH_ATLAS = True
 
 # Colors
 BLACK = (12, 12, 30)
@@ -21,211 +63,1464 @@ YELLOW = (255, 255, 0)
 CYAN = (0, 200, 255)
 PINK = (255, 100, 100)
 
-# Create screen
-screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.FULLSCREEN)
-pygame.display.set_caption("Space Invaders")
-clock = pygame.time.Clock()
+# Display setup. WIDTH, HEIGHT and screen are created by init_display(); the
+# first access from outside the module opens the default fullscreen display
+DISPLAY_MODES = ("fullscreen", "windowed", "headless")
+HEADLESS_SIZE = (1920, 1080)
+display_ready = False
+startup_times = {"import_ms": None, "display_ms": None, "first_frame_ms": None}
+
+def init_display(mode="fullscreen", size=None):
+    global WIDTH, HEIGHT, screen, display_ready
+    if mode not in DISPLAY_MODES:
+        raise ValueError(f"Unknown display mode: {mode!r}")
+    start = time.perf_counter()
+
+    if mode == "headless":
+        # No SDL video needed: the game draws to an offscreen surface, if at all
+        WIDTH, HEIGHT = size or HEADLESS_SIZE
+        screen = pygame.Surface((WIDTH, HEIGHT))
+    else:
+        # Only bring up the subsystems the game uses (no mixer or joystick)
+        pygame.display.init()
+        pygame.font.init()
+        if size is None:
+            info = pygame.display.Info()
+            size = (info.current_w, info.current_h)
+        WIDTH, HEIGHT = size
+        flags = pygame.FULLSCREEN if mode == "fullscreen" else 0
+        screen = pygame.display.set_mode((WIDTH, HEIGHT), flags)
+        pygame.display.set_caption("Space Invaders")
+
+    display_ready = True
+    startup_times["display_ms"] = (time.perf_counter() - start) * 1000
+    return screen
+
+def ensure_display():
+    if not display_ready:
+        init_display()
+
+def __getattr__(name):
+    if name in ("WIDTH", "HEIGHT", "screen"):
+        init_display()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def get_ticks():
+    # pygame.time.get_ticks() reads 0 until pygame.init() has run, so keep our own
+    # millisecond counter that works without any SDL subsystem
+    return int((time.perf_counter() - IMPORT_START) * 1000)
+
+# Clocks: the game reads time only through its clock, so a simulation can run
+# on simulated frame time instead of the wall clock
+class WallClock:
+    def get_ticks(self):
+        return get_ticks()
+
+    def advance(self, ms):
+        pass
+
+class SimClock:
+    def __init__(self, start=0):
+        self.ticks = start
+
+    def get_ticks(self):
+        return int(self.ticks)
+
+    def advance(self, ms):
+        self.ticks += ms
+
+def report_startup(file=sys.stderr):
+    parts = [f"{name[:-3].replace('_', ' ')} {value:.1f} ms"
+             for name, value in startup_times.items() if value is not None]
+    print("Startup: " + ", ".join(parts), file=file)
+
+# Input snapshot for one simulation step. The game core only reads this, so it
+# can be fed from the keyboard or from a scripted policy in headless runs
+InputState = namedtuple("InputState", ["left", "right", "fire"], defaults=[False, False, False])
+NO_INPUT = InputState()
+
+def read_keyboard(fire=False):
+    keys = pygame.key.get_pressed()
+    return InputState(keys[pygame.K_LEFT] or keys[pygame.K_a],
+                      keys[pygame.K_RIGHT] or keys[pygame.K_d], fire)
+
+# Entities keep their exact position as a float Vector2 (top-left corner) and
+# copy it into the integer rect only after moving, for drawing and collisions
+def sync_rect(sprite):
+    sprite.rect.topleft = (round(sprite.pos.x), round(sprite.pos.y))
+
+# Sprite atlas: every sprite kind is rendered once per resolution and the
+# resulting image is shared by all instances of that kind
+def render_player():
+    width = int(WIDTH * 0.0625)
+    height = int(width * 0.6)
+    image = pygame.Surface((width, height), pygame.SRCALPHA)
+    # Draw triangle ship
+    p1 = (width // 2, 0)
+    p2 = (0, height)
+    p3 = (width, height)
+    pygame.draw.polygon(image, CYAN, [p1, p2, p3])
+    return image
+
+def render_player_dim():
+    # Faded ship used for the invulnerability blink
+    image = render_player()
+    image.set_alpha(100)
+    return image
+
+def render_alien(frame=0):
+    # frame 0 and 1 are the two poses of the march animation
+    size = int(WIDTH * 0.045)
+    image = pygame.Surface((size, int(size * 0.75)))
+    image.fill(BLACK)
+    # Draw alien body
+    pygame.draw.rect(image, LIME, (int(size * 0.1), int(size * 0.2),
+                                   int(size * 0.8), int(size * 0.5)))
+    # Draw eyes
+    pygame.draw.circle(image, BLACK, (int(size * 0.3), int(size * 0.35)), int(size * 0.08))
+    pygame.draw.circle(image, BLACK, (int(size * 0.7), int(size * 0.35)), int(size * 0.08))
+    # Antennae and legs swing between the two poses
+    line = max(int(size * 0.04), 1)
+    spread = 0.2 if frame == 0 else 0.35
+    for tip_x, root_x in ((spread, 0.4), (1 - spread, 0.6)):
+        pygame.draw.line(image, LIME, (int(size * tip_x), 0),
+                         (int(size * root_x), int(size * 0.2)), line)
+    legs = (0.15, 0.75) if frame == 0 else (0.3, 0.6)
+    for leg_x in legs:
+        pygame.draw.rect(image, LIME, (int(size * leg_x), int(size * 0.7),
+                                       int(size * 0.1), int(size * 0.05)))
+    # The background is transparent for collision masks
+    image.set_colorkey(BLACK)
+    return image
+
+def render_ufo():
+    size = int(WIDTH * 0.06)
+    image = pygame.Surface((size, int(size * 0.5)), pygame.SRCALPHA)
+    # Draw UFO
+    pygame.draw.ellipse(image, RED, (0, int(size * 0.1), size, int(size * 0.3)))
+    pygame.draw.ellipse(image, YELLOW, (int(size * 0.2), 0, int(size * 0.6), int(size * 0.25)))
+    pygame.draw.circle(image, WHITE, (int(size * 0.5), int(size * 0.15)), int(size * 0.1))
+    return image
+
+def render_bullet(color):
+    radius = int(WIDTH * 0.005)
+    image = pygame.Surface((radius * 2, radius * 2), pygame.SRCALPHA)
+    pygame.draw.circle(image, color, (radius, radius), radius)
+    return image
+
+def render_crater():
+    # Shape punched out of a barrier by one bullet hit
+    radius = int(WIDTH * 0.008)
+    image = pygame.Surface((radius * 2, radius * 2), pygame.SRCALPHA)
+    pygame.draw.circle(image, WHITE, (radius, radius), radius)
+    return image
+
+SPRITE_RENDERERS = {
+    "player": render_player,
+    "player_dim": render_player_dim,
+    "alien": render_alien,
+    "alien_step": lambda: render_alien(1),
+    "ufo": render_ufo,
+    "bullet_friendly": lambda: render_bullet(YELLOW),
+    "bullet_enemy": lambda: render_bullet(PINK),
+    "crater": render_crater,
+}
+
+sprite_cache = {}
+
+def get_sprite(kind):
+    ensure_display()
+    key = (kind, WIDTH, HEIGHT)
+    image = sprite_cache.get(key)
+    if image is None:
+        image = SPRITE_RENDERERS[kind]()
+        # Match the display pixel format so blits skip per-pixel conversion
+        if pygame.display.get_surface() is not None:
+            if image.get_flags() & pygame.SRCALPHA:
+                image = image.convert_alpha()
+            else:
+                image = image.convert()
+        sprite_cache[key] = image
+    return image
+
+mask_cache = {}
+
+def get_mask(kind):
+    # Collision masks are built once per sprite kind and resolution
+    key = (kind, WIDTH, HEIGHT)
+    mask = mask_cache.get(key)
+    if mask is None:
+        mask = mask_cache[key] = pygame.mask.from_surface(get_sprite(kind))
+    return mask
+
+def solid_mask(size):
+    key = ("solid", size)
+    mask = mask_cache.get(key)
+    if mask is None:
+        mask = mask_cache[key] = pygame.mask.Mask(size, fill=True)
+    return mask
 
 class Player(pygame.sprite.Sprite):
-    def __init__(self):
+    def __init__(self, now=0):
         super().__init__()
-        self.width = int(WIDTH * 0.0625)
-        self.height = int(self.width * 0.6)
-        self.image = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
-        # Draw triangle ship
-        p1 = (self.width // 2, 0)
-        p2 = (0, self.height)
-        p3 = (self.width, self.height)
-        pygame.draw.polygon(self.image, CYAN, [p1, p2, p3])
+        self.image = get_sprite("player")
+        # The blink frame has the same shape, so one mask serves both images
+        self.mask = get_mask("player")
+        self.width, self.height = self.image.get_size()
         self.rect = self.image.get_rect()
         self.rect.centerx = WIDTH // 2
         self.rect.bottom = HEIGHT - int(HEIGHT * 0.1)
-        self.speed = int(WIDTH * 0.00625)
+        self.pos = pygame.math.Vector2(self.rect.topleft)
+        self.speed = WIDTH * 0.00625
         self.shoot_delay = 300
-        self.last_shot = pygame.time.get_ticks()
-        self.max_bullets = 3
+        self.last_shot = now
+        self.max_bullets = PLAYER_MAX_BULLETS
         self.invulnerable = 0
         self.blink_timer = 0
 
-    def update(self):
-        keys = pygame.key.get_pressed()
-        if keys[pygame.K_LEFT] or keys[pygame.K_a]:
-            if self.rect.left > 0:
-                self.rect.x -= self.speed
-        if keys[pygame.K_RIGHT] or keys[pygame.K_d]:
-            if self.rect.right < WIDTH:
-                self.rect.x += self.speed
+    def update(self, inputs=NO_INPUT):
+        if inputs.left:
+            self.pos.x = max(self.pos.x - self.speed, 0)
+        if inputs.right:
+            self.pos.x = min(self.pos.x + self.speed, WIDTH - self.width)
+        sync_rect(self)
 
         if self.invulnerable > 0:
             self.invulnerable -= 1
             self.blink_timer += 1
             # Blinking effect
             if self.blink_timer % 10 < 5:
-                self.image.set_alpha(100)
+                self.image = get_sprite("player_dim")
             else:
-                self.image.set_alpha(255)
+                self.image = get_sprite("player")
         else:
-            self.image.set_alpha(255)
+            self.image = get_sprite("player")
 
-    def shoot(self, bullets_group):
-        current_bullets = sum(1 for b in bullets_group if isinstance(b, Bullet) and b.friendly)
-        if current_bullets >= self.max_bullets:
+    def can_shoot(self, live_bullets, now):
+        if live_bullets >= self.max_bullets:
             return False
+        return now - self.last_shot > self.shoot_delay
 
-        now = pygame.time.get_ticks()
-        if now - self.last_shot > self.shoot_delay:
-            self.last_shot = now
-            return True
-        return False
+    def shoot(self, now):
+        # Called once the bullet is actually spawned, so a dropped shot does
+        # not start the cooldown
+        self.last_shot = now
 
 class Alien(pygame.sprite.Sprite):
     def __init__(self, x, y, row, col):
         super().__init__()
         self.row = row
         self.col = col
-        self.size = int(WIDTH * 0.045)
-        self.image = pygame.Surface((self.size, int(self.size * 0.75)))
-        self.image.fill(BLACK)
-        # Draw alien body
-        pygame.draw.rect(self.image, LIME, (int(self.size * 0.1), int(self.size * 0.2),
-                                             int(self.size * 0.8), int(self.size * 0.5)))
-        # Draw eyes
-        pygame.draw.circle(self.image, BLACK, (int(self.size * 0.3), int(self.size * 0.35)),
-                          int(self.size * 0.08))
-        pygame.draw.circle(self.image, BLACK, (int(self.size * 0.7), int(self.size * 0.35)),
-                          int(self.size * 0.08))
+        self.image = get_sprite("alien")
         self.rect = self.image.get_rect()
+        self.reset(x, y)
+
+    def reset(self, x, y, image=None):
+        if image is not None:
+            self.image = image
         self.rect.x = x
         self.rect.y = y
+        # Lattice position; the float position is this plus the formation origin
         self.base_x = x
         self.base_y = y
 
 class UFO(pygame.sprite.Sprite):
-    def __init__(self):
+    def __init__(self, rng=random):
         super().__init__()
+        self.image = get_sprite("ufo")
+        self.mask = get_mask("ufo")
         self.size = int(WIDTH * 0.06)
-        self.image = pygame.Surface((self.size, int(self.size * 0.5)), pygame.SRCALPHA)
-        # Draw UFO
-        pygame.draw.ellipse(self.image, RED, (0, int(self.size * 0.1),
-                                               self.size, int(self.size * 0.3)))
-        pygame.draw.ellipse(self.image, YELLOW, (int(self.size * 0.2), 0,
-                                                  int(self.size * 0.6), int(self.size * 0.25)))
-        pygame.draw.circle(self.image, WHITE, (int(self.size * 0.5), int(self.size * 0.15)),
-                          int(self.size * 0.1))
         self.rect = self.image.get_rect()
+        self.speed = WIDTH * 0.004
+        self.pos = pygame.math.Vector2()
+        self.reset(rng)
+
+    def reset(self, rng=random):
+        # Start a new pass from a random side
         self.rect.y = int(HEIGHT * 0.05)
-        self.speed = int(WIDTH * 0.004)
-        if random.choice([True, False]):
+        if rng.choice([True, False]):
             self.rect.x = -self.size
             self.direction = 1
         else:
             self.rect.x = WIDTH
             self.direction = -1
-        self.points = random.choice([50, 100, 150, 300])
+        self.pos.update(self.rect.topleft)
+        self.points = rng.choice([50, 100, 150, 300])
 
     def update(self):
-        self.rect.x += self.speed * self.direction
+        self.pos.x += self.speed * self.direction
+        sync_rect(self)
         if self.rect.right < 0 or self.rect.left > WIDTH:
             self.kill()
 
 class Bullet(pygame.sprite.Sprite):
-    def __init__(self, x, y, friendly=True):
+    def __init__(self, x, y, friendly=True, pool=None):
         super().__init__()
-        self.radius = int(WIDTH * 0.005)
-        self.image = pygame.Surface((self.radius * 2, self.radius * 2), pygame.SRCALPHA)
-        color = YELLOW if friendly else PINK
-        pygame.draw.circle(self.image, color, (self.radius, self.radius), self.radius)
-        self.rect = self.image.get_rect()
-        self.rect.centerx = x
-        self.rect.centery = y
+        ensure_display()
+        self.pool = pool
+        self.rect = pygame.Rect(0, 0, 0, 0)
+        self.pos = pygame.math.Vector2()
+        self.reset(x, y, friendly)
+
+    def reset(self, x, y, friendly=True):
+        # Reuses the rect and position vector, so recycling a bullet
+        # allocates nothing
+        kind = "bullet_friendly" if friendly else "bullet_enemy"
+        self.image = get_sprite(kind)
+        self.mask = get_mask(kind)
+        self.rect.size = self.image.get_size()
+        self.rect.center = (x, y)
+        self.pos.update(self.rect.topleft)
         self.friendly = friendly
-        self.speed = int(HEIGHT * 0.013) if friendly else int(HEIGHT * 0.008)
+        self.speed = HEIGHT * 0.013 if friendly else HEIGHT * 0.008
+
+    def kill(self):
+        if self.alive():
+            super().kill()
+            if self.pool is not None:
+                self.pool.release(self)
 
     def update(self):
         if self.friendly:
-            self.rect.y -= self.speed
+            self.pos.y -= self.speed
+            sync_rect(self)
             if self.rect.bottom < 0:
                 self.kill()
         else:
-            self.rect.y += self.speed
+            self.pos.y += self.speed
+            sync_rect(self)
             if self.rect.top > HEIGHT:
                 self.kill()
 
+class BulletPool:
+    # Fixed set of preallocated bullets handed out from a free list, with live
+    # counts per side so the max-bullets check needs no scan. The last
+    # `reserved` free slots are kept for friendly bullets, so enemy volleys
+    # cannot starve the player
+    def __init__(self, capacity=BULLET_POOL_SIZE, reserved=PLAYER_MAX_BULLETS):
+        self.free = [Bullet(0, 0, pool=self) for _ in range(capacity)]
+        self.active = {}
+        self.live = {True: 0, False: 0}
+        self.reserved = reserved
+
+    def spawn(self, x, y, friendly, *groups):
+        if not self.free:
+            return None
+        if not friendly and len(self.free) <= self.reserved - self.live[True]:
+            return None
+        bullet = self.free.pop()
+        bullet.reset(x, y, friendly)
+        bullet.add(*groups)
+        self.active[bullet] = None
+        self.live[friendly] += 1
+        return bullet
+
+    def release(self, bullet):
+        del self.active[bullet]
+        self.live[bullet.friendly] -= 1
+        self.free.append(bullet)
+
+    def release_all(self):
+        for bullet in list(self.active):
+            bullet.kill()
+
+class NumpyBullets:
+    # Bullet engine for bullet-hell scale: positions, velocities, owner and
+    # alive flags live in NumPy arrays, so moving and culling every projectile
+    # is a handful of vectorized operations per tick
+    def __init__(self, capacity=1024):
+        if np is None:
+            raise ImportError("NumpyBullets requires NumPy (pip install numpy)")
+        ensure_display()
+        self.images = {True: get_sprite("bullet_friendly"), False: get_sprite("bullet_enemy")}
+        self.size = self.images[True].get_width()
+        self.radius = self.size // 2
+        self.speeds = {True: HEIGHT * 0.013, False: HEIGHT * 0.008}
+        # Top-left corner, like Bullet.pos
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.vx = np.zeros(capacity)
+        self.vy = np.zeros(capacity)
+        self.friendly = np.zeros(capacity, dtype=bool)
+        self.alive = np.zeros(capacity, dtype=bool)
+        # Whether a bullet moved this tick (bullets fired after the move did not)
+        self.moved = np.zeros(capacity, dtype=bool)
+        self.live = {True: 0, False: 0}
+        # Stand-in sprite used to run single bullets through the collision matrix
+        self.probe = pygame.sprite.Sprite()
+        self.probe.rect = pygame.Rect(0, 0, self.size, self.size)
+        self.masks = {True: get_mask("bullet_friendly"), False: get_mask("bullet_enemy")}
+
+    def __len__(self):
+        return self.live[True] + self.live[False]
+
+    def grow(self, needed):
+        capacity = len(self.alive)
+        extra = max(capacity, needed)
+        for name in ("x", "y", "vx", "vy", "friendly", "alive", "moved"):
+            array = getattr(self, name)
+            setattr(self, name, np.concatenate([array, np.zeros(extra, dtype=array.dtype)]))
+
+    def spawn(self, x, y, vx, vy, friendly):
+        # x and y are bullet centres; every argument may be a scalar or an array
+        x, y, vx, vy = np.broadcast_arrays(*(np.atleast_1d(np.asarray(v, dtype=float))
+                                             for v in (x, y, vx, vy)))
+        count = len(x)
+        slots = np.flatnonzero(~self.alive)
+        if len(slots) < count:
+            self.grow(count - len(slots))
+            slots = np.flatnonzero(~self.alive)
+        slots = slots[:count]
+        self.x[slots] = x - self.radius
+        self.y[slots] = y - self.radius
+        self.vx[slots] = vx
+        self.vy[slots] = vy
+        self.friendly[slots] = friendly
+        self.alive[slots] = True
+        self.moved[slots] = False
+        self.live[friendly] += count
+
+    def spawn_pattern(self, x, y, pattern, target):
+        # Enemy shots from one or many shooters (x, y may be arrays)
+        speed = self.speeds[False]
+        x = np.atleast_1d(np.asarray(x, dtype=float))
+        y = np.atleast_1d(np.asarray(y, dtype=float))
+        if pattern == "aimed":
+            dx = target[0] - x
+            dy = target[1] - y
+            length = np.maximum(np.hypot(dx, dy), 1e-9)
+            self.spawn(x, y, dx / length * speed, dy / length * speed, False)
+        elif pattern == "spread":
+            angles = np.linspace(-SPREAD_ARC / 2, SPREAD_ARC / 2, SPREAD_COUNT)
+            self.spawn(np.repeat(x, SPREAD_COUNT), np.repeat(y, SPREAD_COUNT),
+                       np.tile(np.sin(angles) * speed, len(x)),
+                       np.tile(np.cos(angles) * speed, len(x)), False)
+        else:
+            self.spawn(x, y, 0.0, speed, False)
+
+    def update(self):
+        self.x += self.vx
+        self.y += self.vy
+        x = np.rint(self.x)
+        y = np.rint(self.y)
+        self.alive &= ((y + self.size >= 0) & (y <= HEIGHT)
+                       & (x + self.size >= 0) & (x <= WIDTH))
+        self.moved[:] = self.alive
+        self.count_live()
+
+    def count_live(self):
+        friendly = int(np.count_nonzero(self.alive & self.friendly))
+        self.live = {True: friendly, False: int(np.count_nonzero(self.alive)) - friendly}
+
+    def collide(self, game, targets):
+        # Vectorized prefilter of each bullet's swept box against the target
+        # rects of its side, then the few overlapping bullets are swept
+        # through the collision matrix one by one
+        x = np.rint(self.x)
+        y = np.rint(self.y)
+        dx = np.where(self.moved, x - np.rint(self.x - self.vx), 0)
+        dy = np.where(self.moved, y - np.rint(self.y - self.vy), 0)
+        left = np.minimum(x, x - dx)
+        right = np.maximum(x, x - dx) + self.size
+        top = np.minimum(y, y - dy)
+        bottom = np.maximum(y, y - dy) + self.size
+        candidates = np.zeros(len(self.alive), dtype=bool)
+        for friendly in (True, False):
+            side = self.alive & (self.friendly == friendly)
+            if not side.any():
+                continue
+            for rect in targets[friendly]:
+                candidates |= side & ((left < rect.right) & (right > rect.left)
+                                      & (top < rect.bottom) & (bottom > rect.top))
+
+        probe = self.probe
+        hit_any = False
+        for index in np.flatnonzero(candidates).tolist():
+            friendly = probe.friendly = bool(self.friendly[index])
+            probe.mask = self.masks[friendly]
+            probe.rect.topleft = (int(x[index]), int(y[index]))
+            if game.resolve_bullet(probe, int(dx[index]), int(dy[index])):
+                self.alive[index] = False
+                hit_any = True
+        if hit_any:
+            self.count_live()
+
+    def clear(self):
+        self.alive[:] = False
+        self.moved[:] = False
+        self.live = {True: 0, False: 0}
+
+    def draw(self, surface, alpha=1.0):
+        if not len(self):
+            return []
+        rects = []
+        back = (1.0 - alpha) * self.moved
+        for friendly in (True, False):
+            side = self.alive & (self.friendly == friendly)
+            if not side.any():
+                continue
+            xs = np.rint(self.x[side] - self.vx[side] * back[side]).astype(int)
+            ys = np.rint(self.y[side] - self.vy[side] * back[side]).astype(int)
+            image = self.images[friendly]
+            surface.blits([(image, pos) for pos in zip(xs.tolist(), ys.tolist())], doreturn=False)
+            # Individual rects while there are few bullets, one union rect after
+            if len(xs) <= 32:
+                rects.extend(pygame.Rect(px, py, self.size, self.size)
+                             for px, py in zip(xs.tolist(), ys.tolist()))
+            else:
+                rects.append(pygame.Rect(int(xs.min()), int(ys.min()),
+                                         int(xs.max() - xs.min()) + self.size,
+                                         int(ys.max() - ys.min()) + self.size))
+        return rects
+
+BULLET_ENGINES = {"sprite": None, "numpy": NumpyBullets}
+
 class Barrier(pygame.sprite.Sprite):
     def __init__(self, x, y):
         super().__init__()
+        ensure_display()
         self.width = int(WIDTH * 0.1)
         self.height = int(HEIGHT * 0.1)
+        # Eroded pixels are set to the colorkey; the mask tracks what is left
         self.image = pygame.Surface((self.width, self.height))
-        self.image.fill(GREEN)
+        self.image.set_colorkey(BLACK)
         self.rect = self.image.get_rect()
         self.rect.x = x
         self.rect.y = y
-        self.health = 5
+        self.mask = pygame.mask.Mask((self.width, self.height))
+        self.reset()
 
-    def hit(self):
-        self.health -= 1
-        if self.health <= 0:
+    def reset(self):
+        # Restore every pixel in place for a new wave
+        self.image.fill(GREEN)
+        self.mask.fill()
+
+    def sprite_mask(self, sprite):
+        mask = getattr(sprite, "mask", None)
+        if mask is None:
+            mask = solid_mask(sprite.rect.size)
+        return mask
+
+    def overlap(self, sprite):
+        # A solid barrier pixel under sprite, or None if it only covers holes
+        rect = sprite.rect
+        return self.mask.overlap(self.sprite_mask(sprite), (rect.x - self.rect.x, rect.y - self.rect.y))
+
+    def contact_area(self, sprite):
+        # Bounds of the solid barrier pixels under sprite, in barrier
+        # coordinates. The intersection is taken in a sprite-sized mask, so
+        # the cost does not grow with the barrier
+        rect = sprite.rect
+        hit = self.sprite_mask(sprite).overlap_mask(self.mask, (self.rect.x - rect.x,
+                                                                self.rect.y - rect.y))
+        rects = hit.get_bounding_rects()
+        if not rects:
+            return None
+        return rects[0].unionall(rects[1:]).move(rect.x - self.rect.x, rect.y - self.rect.y)
+
+    def hit(self, bullet):
+        # Carve a crater where the bullet first meets solid pixels along its path
+        area = self.contact_area(bullet)
+        if area is None:
+            return
+        crater = get_mask("crater")
+        width, height = crater.get_size()
+        y = area.top if not bullet.friendly else area.bottom - 1
+        offset = (bullet.rect.centerx - self.rect.x - width // 2, y - height // 2)
+        self.mask.erase(crater, offset)
+        # Only the crater's sub-rectangle of the surface is touched
+        crater.to_surface(self.image, setcolor=BLACK, unsetcolor=None, dest=offset)
+        if not self.mask.count():
             self.kill()
-        else:
-            color_intensity = int(255 * (self.health / 5))
-            self.image.fill((0, color_intensity, 0))
 
-class AlienFormation:
-    def __init__(self, level=1):
-        self.aliens = pygame.sprite.Group()
+# Aliens moved per tick by the stepped formation at level 1
+ALIENS_PER_TICK = 8
+
+# Sprite kinds of the alien march animation, toggled on every formation step
+ALIEN_FRAMES = ("alien", "alien_step")
+
+def formation_layout(level, rows=None, cols=None):
+    # Classic layout; larger (stress test) formations are squeezed into the
+    # same screen area
+    rows = rows or min(4 + (level - 1) // 2, 6)
+    cols = cols or 11
+    spacing_x = max(1, min(int(WIDTH * 0.075), int(WIDTH * 0.75) // max(cols - 1, 1)))
+    spacing_y = max(1, min(int(HEIGHT * 0.075), int(HEIGHT * 0.4) // max(rows - 1, 1)))
+    start_x = int(WIDTH * 0.1)
+    start_y = int(HEIGHT * 0.1)
+    return rows, cols, spacing_x, spacing_y, start_x, start_y
+
+def formation_speed(level):
+    # Pixels per frame, scaled with the screen so the pace is resolution independent
+    return WIDTH * 0.0006 * (1 + (level - 1) * 0.3)
+
+class FormationIndex:
+    # Lattice bookkeeping updated incrementally as aliens die: per-column and
+    # per-row alive counts, the bounding box of the living aliens and the
+    # lowest living alien of every column, so edge checks and shooter
+    # selection never scan the formation
+    def __init__(self, rows, cols):
+        self.rows = rows
+        self.cols = cols
+        self.count = rows * cols
+        self.alive = [[True] * rows for _ in range(cols)]  # alive[col][row]
+        self.col_counts = [rows] * cols
+        self.row_counts = [cols] * rows
+        self.bottom_row = [rows - 1] * cols
+        # Living columns, kept dense for O(1) random picks; col_slot maps a
+        # column to its position in live_cols for O(1) removal
+        self.live_cols = list(range(cols))
+        self.col_slot = list(range(cols))
+        self.min_col = 0
+        self.max_col = cols - 1
+        self.min_row = 0
+        self.max_row = rows - 1
+
+    def remove(self, row, col):
+        column = self.alive[col]
+        column[row] = False
+        self.count -= 1
+        self.col_counts[col] -= 1
+        self.row_counts[row] -= 1
+
+        if not self.col_counts[col]:
+            slot = self.col_slot[col]
+            last = self.live_cols.pop()
+            if last != col:
+                self.live_cols[slot] = last
+                self.col_slot[last] = slot
+            self.bottom_row[col] = -1
+        elif row == self.bottom_row[col]:
+            row -= 1
+            while not column[row]:
+                row -= 1
+            self.bottom_row[col] = row
+
+        # Each bound only ever moves inwards, so this is amortized O(1)
+        while self.min_col <= self.max_col and not self.col_counts[self.min_col]:
+            self.min_col += 1
+        while self.max_col >= self.min_col and not self.col_counts[self.max_col]:
+            self.max_col -= 1
+        while self.min_row <= self.max_row and not self.row_counts[self.min_row]:
+            self.min_row += 1
+        while self.max_row >= self.min_row and not self.row_counts[self.max_row]:
+            self.max_row -= 1
+
+    def nearest_live_col(self, col):
+        col = min(max(col, self.min_col), self.max_col)
+        for step in range(self.cols):
+            for candidate in (col - step, col + step):
+                if self.min_col <= candidate <= self.max_col and self.col_counts[candidate]:
+                    return candidate
+        return None
+
+    def pick_column(self, rng, mode="random", target_col=None):
+        if not self.live_cols:
+            return None
+        if mode == "aimed" and target_col is not None:
+            return self.nearest_live_col(target_col)
+        if mode == "weighted":
+            # Rejection sampling weights columns by their alive count without
+            # building a weights list; expected O(1) draws
+            while True:
+                col = rng.choice(self.live_cols)
+                if rng.random() * self.rows < self.col_counts[col]:
+                    return col
+        return rng.choice(self.live_cols)
+
+# Alien formations. Game and the renderers talk to a formation only through
+# update(), len(), collide(), bounds(), get_shot_origin(), volley_origins(),
+# nearest_alien_x(), reset_steps(), sync_hash(), render_sprites(), draw_below(),
+# draw_dirty(), set_draw_offset() and the origin, spatial_hash and
+# candidate_pairs attributes, so the backends in FORMATION_BACKENDS are
+# interchangeable
+class Formation:
+    # build=False skips laying out the aliens; the formation is unusable until
+    # reset() or a finished reset_steps(), so Game can spread the first build
+    # of a spare wave over idle frames
+    def __init__(self, level=1, rng=random, rows=None, cols=None, shot_mode=ALIEN_SHOT_MODE,
+                 build=True):
+        if shot_mode not in ALIEN_SHOT_MODES:
+            raise ValueError(f"Unknown shot mode: {shot_mode!r}")
+        ensure_display()
+        self.rng = rng
         self.direction = 1
-        self.speed = 1 + (level - 1) * 0.3
+        self.speed = formation_speed(level)
+        # The formation moves rigidly, so one float origin stands in for every
+        # alien's sub-pixel position
+        self.origin = pygame.math.Vector2(0, 0)
+        self.draw_offset = (0, 0)
         self.drop_amount = int(HEIGHT * 0.03)
         self.level = level
-        self.create_formation()
-
-    def create_formation(self):
-        rows = min(4 + (self.level - 1) // 2, 6)
-        cols = 11
-        spacing_x = int(WIDTH * 0.075)
-        spacing_y = int(HEIGHT * 0.075)
-        start_x = int(WIDTH * 0.1)
-        start_y = int(HEIGHT * 0.1)
-
-        for row in range(rows):
-            for col in range(cols):
-                alien = Alien(col * spacing_x + start_x, row * spacing_y + start_y, row, col)
-                self.aliens.add(alien)
+        self.shot_mode = shot_mode
+        # Set by Game; the broad phase for formations whose aliens leave the
+        # lattice (SteppedFormation)
+        self.spatial_hash = None
+        # Cells or aliens examined by collide() since the caller last reset it
+        self.candidate_pairs = 0
+        # Both animation frames come from the sprite atlas; a step only swaps
+        # which shared image and mask are current
+        self.frames = [get_sprite(kind) for kind in ALIEN_FRAMES]
+        self.frame_masks = [get_mask(kind) for kind in ALIEN_FRAMES]
+        self.frame = 0
+        self.image = self.frames[0]
+        self.mask = self.frame_masks[0]
+        # Horizontal distance the formation travels per animation step
+        self.step_size = WIDTH * 0.01
+        self.step_travel = 0.0
+        self.alien_width, self.alien_height = self.image.get_size()
+        self.layout_override = (rows, cols)
+        if build:
+            self.create_formation(rows, cols)
+
+    def reset(self, level):
+        # Set up the next wave in place, reusing this formation's objects
+        for _ in self.reset_steps(level):
+            pass
+
+    def reset_steps(self, level):
+        # reset() as a generator that yields between chunks of work, so a
+        # rebuild can be paused whenever a frame runs out of idle time
+        self.level = level
+        self.direction = 1
+        self.speed = formation_speed(level)
+        self.origin.update(0, 0)
+        self.draw_offset = (0, 0)
+        self.candidate_pairs = 0
+        self.step_travel = 0.0
+        # The base version only: the layout below gives every alien the frame
+        # 0 image, and a formation built with build=False has no aliens yet
+        Formation.set_frame(self, 0)
+        yield from self.create_steps(*self.layout_override)
+
+    def create_formation(self, rows=None, cols=None):
+        for _ in self.create_steps(rows, cols):
+            pass
+
+    def create_steps(self, rows=None, cols=None):
+        rows, cols, spacing_x, spacing_y, start_x, start_y = formation_layout(self.level, rows, cols)
+        self.spacing_x, self.spacing_y = spacing_x, spacing_y
+        self.start_x, self.start_y = start_x, start_y
+        self.index = FormationIndex(rows, cols)
+        self.initial_count = self.index.count
+        yield
+
+    def __len__(self):
+        return self.index.count
+
+    def offset(self):
+        return round(self.origin.x), round(self.origin.y)
+
+    def cell_position(self, row, col):
+        ox, oy = self.offset()
+        return self.start_x + col * self.spacing_x + ox, self.start_y + row * self.spacing_y + oy
 
     def update(self):
-        if not self.aliens:
+        if not len(self):
             return False
 
-        # Adjust speed based on remaining aliens
-        current_speed = self.speed * (1 + (1 - len(self.aliens) / 40) * 0.5)
+        # Speed up as the wave thins out, up to 1.5x with one alien left
+        current_speed = self.speed * (1 + (1 - len(self) / self.initial_count) * 0.5)
 
-        # Move aliens
-        needs_drop = False
-        for alien in self.aliens:
-            alien.rect.x += self.direction * current_speed
-            if alien.rect.left <= 0 or alien.rect.right >= WIDTH:
-                needs_drop = True
+        old_x = round(self.origin.x)
+        self.origin.x += self.direction * current_speed
+        self.shift(round(self.origin.x) - old_x, 0)
+        self.step_travel += current_speed
+        stepped = self.step_travel >= self.step_size
+        if stepped:
+            self.step_travel -= self.step_size
 
-        if needs_drop:
+        bounds = self.bounds()
+        if bounds.left <= 0 or bounds.right >= WIDTH:
             self.direction *= -1
-            for alien in self.aliens:
-                alien.rect.y += self.drop_amount
+            self.origin.y += self.drop_amount
+            bounds.y += self.drop_amount
+            self.shift(0, self.drop_amount)
+            stepped = True
+        if stepped:
+            self.set_frame(1 - self.frame)
 
         # Check if aliens reached bottom
+        return bounds.bottom >= HEIGHT - int(HEIGHT * 0.15)
+
+    def shift(self, dx, dy):
+        # Called whenever the whole-pixel position of the formation changes
+        pass
+
+    def set_frame(self, frame):
+        self.frame = frame
+        self.image = self.frames[frame]
+        self.mask = self.frame_masks[frame]
+
+    def bounds(self):
+        # Screen rect around the living aliens, straight from the tracked extent
+        index = self.index
+        left, top = self.cell_position(index.min_row, index.min_col)
+        return pygame.Rect(left, top,
+                           (index.max_col - index.min_col) * self.spacing_x + self.alien_width,
+                           (index.max_row - index.min_row) * self.spacing_y + self.alien_height)
+
+    def collide(self, sprite):
+        # Kill every alien touching sprite and return how many died
+        hits = self.find_hits(sprite)
+        # Rect hits are confirmed pixel by pixel when the sprite has a mask
+        mask = getattr(sprite, "mask", None)
+        if hits and mask is not None:
+            hits = [(row, col) for row, col in hits if self.mask_hit(mask, sprite.rect, row, col)]
+        for row, col in hits:
+            self.kill_alien(row, col)
+        return len(hits)
+
+    def find_hits(self, sprite):
+        # Every alien sits exactly on the lattice, so the cells under the
+        # sprite are found by arithmetic instead of a scan
+        return self.grid_hits(sprite.rect)
+
+    def grid_hits(self, rect):
+        # Only the lattice cells whose alien rect can overlap rect are tested;
+        # for a bullet that is one or two cells
+        index = self.index
+        ox, oy = self.offset()
+        left = rect.left - self.start_x - ox
+        top = rect.top - self.start_y - oy
+        first_col = max((left - self.alien_width) // self.spacing_x + 1, index.min_col)
+        last_col = min((left + rect.width - 1) // self.spacing_x, index.max_col)
+        first_row = max((top - self.alien_height) // self.spacing_y + 1, index.min_row)
+        last_row = min((top + rect.height - 1) // self.spacing_y, index.max_row)
+        hits = []
+        self.candidate_pairs += (max(last_col - first_col + 1, 0)
+                                 * max(last_row - first_row + 1, 0))
+        for col in range(first_col, last_col + 1):
+            column = index.alive[col]
+            for row in range(first_row, last_row + 1):
+                if column[row]:
+                    hits.append((row, col))
+        return hits
+
+    def alien_topleft(self, row, col):
+        # Where the alien in a cell actually is; the lattice cell on grid
+        return self.cell_position(row, col)
+
+    def mask_hit(self, mask, rect, row, col):
+        x, y = self.alien_topleft(row, col)
+        return self.mask.overlap(mask, (rect.x - x, rect.y - y)) is not None
+
+    def kill_alien(self, row, col):
+        self.index.remove(row, col)
+
+    def column_at(self, x):
+        ox = round(self.origin.x)
+        return round((x - self.start_x - ox - self.alien_width / 2) / self.spacing_x)
+
+    def shooter_cell(self, target_x=None):
+        # The lowest living alien of a column picked according to shot_mode
+        target_col = None if target_x is None else self.column_at(target_x)
+        col = self.index.pick_column(self.rng, self.shot_mode, target_col)
+        if col is None:
+            return None
+        return self.index.bottom_row[col], col
+
+    def get_shot_origin(self, target_x=None):
+        cell = self.shooter_cell(target_x)
+        if cell is None:
+            return None
+        x, y = self.alien_topleft(*cell)
+        return x + self.alien_width // 2, y + self.alien_height
+
+    def volley_origins(self):
+        # Shot origins under the lowest alien of every living column
+        index = self.index
+        origins = []
+        for col in index.live_cols:
+            x, y = self.alien_topleft(index.bottom_row[col], col)
+            origins.append((x + self.alien_width // 2, y + self.alien_height))
+        return origins
+
+    def nearest_alien_x(self, x):
+        if not len(self):
+            return None
+        col = self.index.nearest_live_col(self.column_at(x))
+        return self.cell_position(0, col)[0] + self.alien_width // 2
+
+    def sprites(self):
+        return []
+
+    def render_sprites(self):
+        # Sprites Game draws through all_sprites
+        return self.sprites()
+
+    def draw_below(self, surface):
+        # Drawn under all_sprites on a full redraw
+        return []
+
+    def draw_dirty(self, surface, background, erased):
+        # Incremental version of draw_below for DirtyRenderer: repaint what
+        # changed since the last frame plus the already erased rects, and
+        # return the rects that changed
+        return []
+
+    def sync_hash(self):
+        # Bring the broad phase up to date; lattice formations keep nothing
+        # in it
+        pass
+
+    def set_draw_offset(self, dx, dy):
+        self.draw_offset = (dx, dy)
+
+class AlienFormation(Formation):
+    # Every alien is a sprite in self.aliens, drawn with Game.all_sprites
+    def __init__(self, *args, **kwargs):
+        # Alien sprites by cell, kept across waves and reset in place
+        self.alien_pool = {}
+        self.aliens = pygame.sprite.Group()
+        self.grid = {}
+        super().__init__(*args, **kwargs)
+
+    def create_steps(self, rows=None, cols=None):
+        yield from super().create_steps(rows, cols)
+        self.aliens.empty()
+        self.grid.clear()
+        image = self.image
+        for row in range(self.index.rows):
+            yield
+            for col in range(self.index.cols):
+                x = col * self.spacing_x + self.start_x
+                y = row * self.spacing_y + self.start_y
+                alien = self.alien_pool.get((row, col))
+                if alien is None:
+                    alien = self.alien_pool[row, col] = Alien(x, y, row, col)
+                else:
+                    alien.reset(x, y, image)
+                self.aliens.add(alien)
+                self.grid[row, col] = alien
+
+    def sprites(self):
+        return self.aliens.sprites()
+
+    def alien_topleft(self, row, col):
+        return self.grid[row, col].rect.topleft
+
+    def shift(self, dx, dy):
+        if dx or dy:
+            for alien in self.aliens:
+                alien.rect.move_ip(dx, dy)
+
+    def set_frame(self, frame):
+        super().set_frame(frame)
+        image = self.image
         for alien in self.aliens:
-            if alien.rect.bottom >= HEIGHT - int(HEIGHT * 0.15):
-                return True  # Game over
-        return False
+            alien.image = image
+
+    def kill_alien(self, row, col):
+        super().kill_alien(row, col)
+        alien = self.grid.pop((row, col))
+        alien.kill()
+        if self.spatial_hash is not None:
+            self.spatial_hash.remove(alien)
+
+    def set_draw_offset(self, dx, dy):
+        # Shift rects for an interpolated frame; (0, 0) puts them back
+        old_dx, old_dy = self.draw_offset
+        if (dx, dy) != (old_dx, old_dy):
+            self.shift(dx - old_dx, dy - old_dy)
+            self.draw_offset = (dx, dy)
+
+class SteppedFormation(AlienFormation):
+    # Arcade-style stepping: a cursor walks the living aliens, bottom row
+    # first, and moves at most aliens_per_tick of them each tick. Formation
+    # work per tick is bounded regardless of formation size, and the march
+    # speeds up by itself as aliens die and sweeps get shorter
+    def __init__(self, *args, aliens_per_tick=None, **kwargs):
+        self.aliens_per_tick_override = aliens_per_tick
+        super().__init__(*args, **kwargs)
+
+    def create_steps(self, rows=None, cols=None):
+        yield from super().create_steps(rows, cols)
+        self.reset_march()
+
+    def reset_march(self):
+        self.march_step = max(int(WIDTH * 0.004), 1)
+        self.aliens_per_tick = self.aliens_per_tick_override or round(
+            ALIENS_PER_TICK * (1 + (self.level - 1) * 0.3))
+        # Living aliens in march order, bottom row first; kills drop out of it,
+        # so starting a sweep never walks dead lattice cells
+        index = self.index
+        self.march_order = dict.fromkeys(self.grid[row, col] for row in reversed(range(index.rows))
+                                         for col in range(index.cols) if index.alive[col][row])
+        self.sweep = []
+        self.cursor = 0
+        self.step = (0, 0)
+        self.drop_next = False
+        self.edge_hit = False
+        self.reached_bottom = False
+        # True while every alien sits exactly on the lattice, between sweeps
+        self.on_grid = True
+        # Aliens moved by the last update; only these need re-bucketing
+        self.moved = []
+        self.hashed = False
+        # Screen rects changed since the last draw (old and new positions of
+        # moved aliens, dead aliens); past a limit, redraw the whole formation
+        self.dirty = []
+        self.redraw_all = True
+        self.drawn_bounds = self.bounds()
 
-    def get_random_shooter(self):
-        if self.aliens:
-            return random.choice(self.aliens.sprites())
-        return None
+    def update(self):
+        if not len(self):
+            return False
+        if self.cursor >= len(self.sweep):
+            self.start_sweep()
+        dx, dy = self.step
+        end = min(self.cursor + self.aliens_per_tick, len(self.sweep))
+        bottom = HEIGHT - int(HEIGHT * 0.15)
+        self.moved = moved = []
+        dirty = self.dirty
+        # Each alien switches to the next march frame as it steps
+        image = self.frames[1 - self.frame]
+        for alien in self.sweep[self.cursor:end]:
+            if not alien.alive():
+                continue
+            rect = alien.rect
+            dirty.append(rect.copy())
+            rect.move_ip(dx, dy)
+            alien.image = image
+            dirty.append(rect.copy())
+            moved.append(alien)
+            if (dx > 0 and rect.right >= WIDTH) or (dx < 0 and rect.left <= 0):
+                self.edge_hit = True
+            if rect.bottom >= bottom:
+                self.reached_bottom = True
+        self.cursor = end
+        self.on_grid = False
+        if self.cursor >= len(self.sweep):
+            self.finish_sweep()
+        self.limit_dirty()
+        return self.reached_bottom
+
+    def limit_dirty(self):
+        # Without frames drawn (headless), dirty rects must not pile up
+        if len(self.dirty) > 2 * len(self) + 16:
+            self.dirty = []
+            self.redraw_all = True
+
+    def start_sweep(self):
+        self.sweep = list(self.march_order)
+        self.cursor = 0
+        if self.drop_next:
+            self.step = (0, self.drop_amount)
+            self.drop_next = False
+        else:
+            self.step = (self.direction * self.march_step, 0)
+
+    def finish_sweep(self):
+        # Every living alien has taken the step, so the lattice holds again
+        self.origin += self.step
+        self.on_grid = True
+        self.set_frame(1 - self.frame)
+        if self.edge_hit:
+            self.direction *= -1
+            self.drop_next = True
+            self.edge_hit = False
+
+    def set_frame(self, frame):
+        # Aliens already took their new image as they stepped
+        Formation.set_frame(self, frame)
+
+    def alien_mask(self, row, col):
+        image = self.grid[row, col].image
+        return self.frame_masks[0] if image is self.frames[0] else self.frame_masks[1]
+
+    def mask_hit(self, mask, rect, row, col):
+        x, y = self.alien_topleft(row, col)
+        return self.alien_mask(row, col).overlap(mask, (rect.x - x, rect.y - y)) is not None
+
+    def kill_alien(self, row, col):
+        alien = self.grid[row, col]
+        self.dirty.append(alien.rect.copy())
+        del self.march_order[alien]
+        super().kill_alien(row, col)
+        self.limit_dirty()
+
+    def render_sprites(self):
+        # Drawn by draw_below()/draw_dirty() rather than all_sprites, so only
+        # aliens that moved or died are repainted
+        return []
+
+    def draw_below(self, surface):
+        aliens = sorted(self.aliens, key=self.draw_order)
+        surface.blits([(alien.image, alien.rect) for alien in aliens], doreturn=False)
+        self.dirty = []
+        self.redraw_all = False
+        self.drawn_bounds = self.bounds() if len(self) else pygame.Rect(0, 0, 0, 0)
+        return []
+
+    @staticmethod
+    def draw_order(alien):
+        return alien.row, alien.col
+
+    def aliens_in(self, rect):
+        if self.hashed and self.spatial_hash is not None:
+            aliens = self.spatial_hash.query(rect, "alien")
+        else:
+            aliens = [alien for alien in self.aliens if rect.colliderect(alien.rect)]
+        return sorted(aliens, key=self.draw_order)
+
+    def draw_dirty(self, surface, background, erased):
+        if self.redraw_all:
+            changed = [self.drawn_bounds]
+            if len(self):
+                changed.append(self.bounds())
+        else:
+            changed = self.dirty
+        # Each area is repainted from the background up, clipped to the area,
+        # so overlapping aliens come out exactly as in a full redraw
+        for area in changed + erased:
+            surface.set_clip(area)
+            surface.blit(background, area, area)
+            surface.blits([(alien.image, alien.rect) for alien in self.aliens_in(area)],
+                          doreturn=False)
+        surface.set_clip(None)
+        self.dirty = []
+        self.redraw_all = False
+        if len(self):
+            self.drawn_bounds = self.bounds()
+        return changed
+
+    def find_hits(self, sprite):
+        # Mid-sweep the lattice does not hold, so aliens come from the broad
+        # phase instead
+        if self.on_grid:
+            return self.grid_hits(sprite.rect)
+        if self.spatial_hash is not None:
+            hits = self.spatial_hash.collide(sprite, "alien")
+        else:
+            self.candidate_pairs += len(self)
+            hits = pygame.sprite.spritecollide(sprite, self.aliens, False)
+        return [(alien.row, alien.col) for alien in hits]
+
+    def bounds(self):
+        # Mid-sweep, aliens sit on the lattice or one step past it
+        rect = super().bounds()
+        if self.on_grid:
+            return rect
+        return rect.union(rect.move(self.step))
+
+    def sync_hash(self):
+        spatial_hash = self.spatial_hash
+        if spatial_hash is None:
+            return
+        if not self.hashed:
+            spatial_hash.sync(self.aliens, "alien")
+            self.hashed = True
+            return
+        for alien in self.moved:
+            if alien.alive():
+                spatial_hash.move(alien)
+
+    def set_draw_offset(self, dx, dy):
+        # Steps are discrete, so there is nothing to interpolate
+        pass
+
+class NumpyFormation(Formation):
+    # Struct-of-arrays backend: alien lattice positions and an alive mask live
+    # in NumPy arrays, so every per-alien pass is a single vectorized operation
+    def __init__(self, *args, **kwargs):
+        if np is None:
+            raise ImportError("NumpyFormation requires NumPy (pip install numpy)")
+        super().__init__(*args, **kwargs)
+
+    def create_steps(self, rows=None, cols=None):
+        yield from super().create_steps(rows, cols)
+        rows, cols = self.index.rows, self.index.cols
+        # Screen rect of the last draw, erased by the next draw_dirty()
+        self.drawn = None
+        # A new wave with the same lattice reuses the arrays
+        if getattr(self, "lattice", None) == (rows, cols, self.spacing_x, self.spacing_y):
+            self.alive.fill(True)
+            return
+        self.lattice = (rows, cols, self.spacing_x, self.spacing_y)
+        self.rows = np.repeat(np.arange(rows), cols)
+        self.cols = np.tile(np.arange(cols), rows)
+        self.base_x = self.cols * self.spacing_x + self.start_x
+        self.base_y = self.rows * self.spacing_y + self.start_y
+        self.alive = np.ones(rows * cols, dtype=bool)
+
+    def kill_alien(self, row, col):
+        super().kill_alien(row, col)
+        self.alive[row * self.index.cols + col] = False
+
+    def draw_below(self, surface):
+        # Drawn under all_sprites like the sprite backend's aliens
+        self.drawn = None
+        if not len(self):
+            return []
+        ox, oy = self.offset()
+        ox += self.draw_offset[0]
+        oy += self.draw_offset[1]
+        xs = self.base_x[self.alive] + ox
+        ys = self.base_y[self.alive] + oy
+        image = self.image
+        surface.blits([(image, pos) for pos in zip(xs.tolist(), ys.tolist())], doreturn=False)
+        # One rect covering the whole formation is cheaper than one per alien
+        self.drawn = pygame.Rect(int(xs.min()), int(ys.min()),
+                                 int(xs.max() - xs.min()) + self.alien_width,
+                                 int(ys.max() - ys.min()) + self.alien_height)
+        return [self.drawn]
+
+    def draw_dirty(self, surface, background, erased):
+        # The formation moves every tick, so erase where it was and draw it
+        # again; sprites erased over it are repainted by the new blits
+        dirty = []
+        if self.drawn is not None:
+            surface.blit(background, self.drawn, self.drawn)
+            dirty.append(self.drawn)
+        return dirty + self.draw_below(surface)
+
+class CachedFormation(Formation):
+    # Render cache backend: the living aliens are composed once into a single
+    # colorkeyed surface in lattice coordinates. The formation moves rigidly,
+    # so a frame is one blit at the formation offset, and a kill only erases
+    # that alien's cell from the cache
+    def create_steps(self, rows=None, cols=None):
+        yield from super().create_steps(rows, cols)
+        index = self.index
+        size = ((index.cols - 1) * self.spacing_x + self.alien_width,
+                (index.rows - 1) * self.spacing_y + self.alien_height)
+        # One cache per animation frame, so a step swaps caches; a new wave
+        # of the same size redraws into the existing ones
+        caches = getattr(self, "caches", None)
+        if caches is None or caches[0].get_size() != size:
+            # Created straight in the display format when there is one; a
+            # convert() would allocate and copy the surface a second time
+            display = pygame.display.get_surface()
+            caches = []
+            for _ in self.frames:
+                yield
+                caches.append(pygame.Surface(size, 0, display) if display is not None
+                              else pygame.Surface(size))
+            self.caches = caches
+        for cache, image in zip(caches, self.frames):
+            yield from self.compose(cache, image)
+        self.cache = caches[self.frame]
+        # Screen rect of the last blit, erased by the next draw_dirty()
+        self.drawn = None
+
+    def compose(self, cache, image):
+        # Redraw every living alien into a cache, row by row like the sprite
+        # backend so overlapping aliens in squeezed layouts stack the same way.
+        # Each step clears only the band the next row reaches into, so no
+        # single step has to fill the whole cache
+        index = self.index
+        cache.set_colorkey(BLACK)
+        cleared = 0
+        for row in range(index.rows):
+            yield
+            bottom = row * self.spacing_y + self.alien_height
+            cache.fill(BLACK, (0, cleared, cache.get_width(), bottom - cleared))
+            cleared = bottom
+            cache.blits([(image, (col * self.spacing_x, row * self.spacing_y))
+                         for col in range(index.cols) if index.alive[col][row]], doreturn=False)
+
+    def set_frame(self, frame):
+        super().set_frame(frame)
+        self.cache = self.caches[frame]
+
+    def cell_rect(self, row, col):
+        # An alien's rect inside the cache
+        return pygame.Rect(col * self.spacing_x, row * self.spacing_y,
+                           self.alien_width, self.alien_height)
+
+    def kill_alien(self, row, col):
+        super().kill_alien(row, col)
+        # Clear the dead alien's cell and redraw, clipped to it, the living
+        # neighbours whose cells overlap it in squeezed layouts
+        index = self.index
+        reach_row = (self.alien_height - 1) // self.spacing_y
+        reach_col = (self.alien_width - 1) // self.spacing_x
+        neighbours = [(r, c)
+                      for r in range(max(row - reach_row, 0), min(row + reach_row, index.rows - 1) + 1)
+                      for c in range(max(col - reach_col, 0), min(col + reach_col, index.cols - 1) + 1)
+                      if index.alive[c][r]]
+        cell = self.cell_rect(row, col)
+        for cache, image in zip(self.caches, self.frames):
+            cache.set_clip(cell)
+            cache.fill(BLACK, cell)
+            cache.blits([(image, (c * self.spacing_x, r * self.spacing_y)) for r, c in neighbours],
+                        doreturn=False)
+            cache.set_clip(None)
+
+    def draw_below(self, surface):
+        # Drawn under all_sprites, where the sprite backend's aliens go, so
+        # both backends produce the same pixels
+        self.drawn = None
+        if not len(self):
+            return []
+        # Only the part of the cache spanned by living aliens is blitted
+        index = self.index
+        area = self.cell_rect(index.min_row, index.min_col).union(
+            self.cell_rect(index.max_row, index.max_col))
+        ox, oy = self.offset()
+        dest = area.move(self.start_x + ox + self.draw_offset[0],
+                         self.start_y + oy + self.draw_offset[1])
+        surface.blit(self.cache, dest, area)
+        self.drawn = dest
+        return [dest]
+
+    def draw_dirty(self, surface, background, erased):
+        # The formation moves every tick, so erase where it was and draw it
+        # again; sprites erased over it are repainted by the new blit
+        dirty = []
+        if self.drawn is not None:
+            surface.blit(background, self.drawn, self.drawn)
+            dirty.append(self.drawn)
+        return dirty + self.draw_below(surface)
+
+FORMATION_BACKENDS = {"sprite": AlienFormation, "numpy": NumpyFormation,
+                      "cached": CachedFormation, "stepped": SteppedFormation}
+
+# Broad-phase collision: collidable sprites are bucketed per layer into a
+# uniform grid, so a query only looks at sprites sharing a cell with the rect
+class SpatialHash:
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.layers = {}
+        self.cells = {}  # sprite -> (layer, cell range) it is bucketed under
+        self.members = {}  # layer -> sprites bucketed under it
+        self.candidate_pairs = 0
+
+    def cell_range(self, rect):
+        size = self.cell_size
+        return (rect.left // size, rect.top // size,
+                (rect.right - 1) // size, (rect.bottom - 1) // size)
+
+    def add(self, sprite, layer):
+        cells = self.cell_range(sprite.rect)
+        buckets = self.layers.setdefault(layer, {})
+        x0, y0, x1, y1 = cells
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                buckets.setdefault((cx, cy), []).append(sprite)
+        self.cells[sprite] = (layer, cells)
+        self.members.setdefault(layer, set()).add(sprite)
+
+    def remove(self, sprite):
+        entry = self.cells.pop(sprite, None)
+        if entry is None:
+            return
+        layer, (x0, y0, x1, y1) = entry
+        self.members[layer].discard(sprite)
+        buckets = self.layers[layer]
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = buckets[cx, cy]
+                bucket.remove(sprite)
+                if not bucket:
+                    del buckets[cx, cy]
+
+    def move(self, sprite):
+        # Re-bucket a tracked sprite if it crossed a cell boundary
+        layer, cells = self.cells[sprite]
+        if cells != self.cell_range(sprite.rect):
+            self.remove(sprite)
+            self.add(sprite, layer)
+
+    def sync(self, group, layer):
+        # Incremental update: only sprites that appeared, died or crossed a
+        # cell boundary since the last sync touch the buckets
+        present = set(group)
+        for sprite in self.members.get(layer, set()) - present:
+            self.remove(sprite)
+        for sprite in group:
+            if sprite in self.cells:
+                self.move(sprite)
+            else:
+                self.add(sprite, layer)
+
+    def candidates(self, rect, layer):
+        # Sprites in layer bucketed in any cell under rect, deduplicated in a
+        # deterministic order
+        buckets = self.layers.get(layer)
+        if not buckets:
+            return {}
+        x0, y0, x1, y1 = self.cell_range(rect)
+        candidates = {}
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                for other in buckets.get((cx, cy), ()):
+                    candidates[other] = None
+        return candidates
+
+    def query(self, rect, layer):
+        return [other for other in self.candidates(rect, layer) if rect.colliderect(other.rect)]
+
+    def collide(self, sprite, layer):
+        # Sprites in layer overlapping sprite.rect, in a deterministic order
+        rect = sprite.rect
+        candidates = self.candidates(rect, layer)
+        self.candidate_pairs += len(candidates)
+        return [other for other in candidates if rect.colliderect(other.rect)]
+
+def sweep(rect, dx, dy):
+    # Top-left positions along a move of (dx, dy) that ended at rect. Steps are
+    # at most one rect size apart, so the stepped rects cover the whole swept
+    # area and a fast bullet cannot tunnel through a thin target; a bullet
+    # slower than its own size takes a single step, the current position
+    steps = max(math.ceil(abs(dx) / rect.width), math.ceil(abs(dy) / rect.height), 1)
+    x0, y0 = rect.x - dx, rect.y - dy
+    return [(round(x0 + dx * i / steps), round(y0 + dy * i / steps))
+            for i in range(1, steps + 1)]
+
+# Collision matrix: which bullets ("friendly" True/False, None for both) can
+# hit which target, and the Game handler applying the effect. Rules are tried
+# in this order and the first one that hits consumes the bullet
+CollisionRule = namedtuple("CollisionRule", ["friendly", "target", "handler"])
+COLLISION_RULES = (
+    CollisionRule(True, "alien", "bullet_hits_aliens"),
+    CollisionRule(True, "ufo", "bullet_hits_ufo"),
+    CollisionRule(None, "barrier", "bullet_hits_barriers"),
+    CollisionRule(False, "player", "bullet_hits_player"),
+)
 
 # Game state
 class Game:
-    def __init__(self):
+    def __init__(self, renderer=None, clock=None, seed=None, formation_class=AlienFormation,
+                 bullet_engine=None, bullet_pattern=BULLET_PATTERN, volley=False):
+        if bullet_pattern not in BULLET_PATTERNS:
+            raise ValueError(f"Unknown bullet pattern: {bullet_pattern!r}")
+        ensure_display()
+        self.formation_class = formation_class
+        # Optional array-based bullet engine (e.g. NumpyBullets) used instead
+        # of pooled Bullet sprites; volley makes every living column fire
+        self.bullet_engine = bullet_engine() if bullet_engine is not None else None
+        self.bullet_pattern = bullet_pattern
+        self.volley = volley
+        self.draw_alpha = 1.0
+        self.clock = clock or WallClock()
+        self.rng = random.Random(seed)
+        # Rendering is optional: a game without a renderer is a pure simulation
+        self.renderer = renderer
+        self.hud = HUD()
+        self.collision_stats = {"frames": 0, "candidate_pairs": 0, "naive_pairs": 0}
+        # Level clear to the first frame of the next wave, in milliseconds
+        self.transition_stats = {"count": 0, "total_ms": 0.0, "max_ms": 0.0}
+        self.level_cleared_at = None
+        self.bullet_pool = BulletPool()
+        # Barriers and the UFO are reset in place for every wave
+        self.barrier_pool = self.make_barriers()
+        self.ufo = None
+        # The next wave is built ahead of time (see prepare_next_wave) and
+        # swapped in at level clear; spare_level is the level it is ready for
+        self.spare_formation = None
+        self.spare_barriers = self.make_barriers()
+        self.spare_level = None
+        # The wave_steps() generator of a build in progress
+        self.wave_builder = None
+        # Per bullet side, the (find, handle) pairs of the collision matrix
+        self.collision_rules = {
+            friendly: [(getattr(self, "find_" + rule.target), getattr(self, rule.handler))
+                       for rule in COLLISION_RULES if rule.friendly in (None, friendly)]
+            for friendly in (True, False)
+        }
         self.reset()
 
     def reset(self):
@@ -234,35 +1529,95 @@ class Game:
         self.level = 1
         self.game_over = False
         self.paused = False
-
-        self.all_sprites = pygame.sprite.Group()
+        self.frame = 0
+        self.prev_positions = {}
+        self.prev_origin = None
+        # A half-built spare is for the old game's next level; start over
+        self.wave_builder = None
+        self.bullet_pool.release_all()
+        if self.bullet_engine is not None:
+            self.bullet_engine.clear()
+
+        self.all_sprites = pygame.sprite.RenderUpdates()
         self.bullets = pygame.sprite.Group()
         self.barriers = pygame.sprite.Group()
         self.ufos = pygame.sprite.Group()
 
-        self.player = Player()
+        # Cells about the size of an alien lattice step
+        self.spatial_hash = SpatialHash(max(1, int(WIDTH * 0.075)))
+
+        now = self.clock.get_ticks()
+        self.player = Player(now)
         self.all_sprites.add(self.player)
 
-        self.formation = AlienFormation(self.level)
-        self.all_sprites.add(self.formation.aliens)
+        self.formation = self.formation_class(self.level, self.rng)
+        self.formation.spatial_hash = self.spatial_hash
+        self.all_sprites.add(self.formation.render_sprites())
 
         self.create_barriers()
 
         self.alien_shoot_delay = max(800, 1500 - self.level * 100)
-        self.last_alien_shot = pygame.time.get_ticks()
+        self.last_alien_shot = now
 
-        self.ufo_spawn_delay = random.randint(15000, 30000)
-        self.last_ufo_spawn = pygame.time.get_ticks()
+        self.ufo_spawn_delay = self.rng.randint(15000, 30000)
+        self.last_ufo_spawn = now
 
-    def create_barriers(self):
+    def make_barriers(self):
         barrier_y = HEIGHT - int(HEIGHT * 0.25)
-        positions = [int(WIDTH * p) for p in [0.15, 0.38, 0.62, 0.85]]
-        for pos in positions:
-            barrier = Barrier(pos - int(WIDTH * 0.05), barrier_y)
-            self.barriers.add(barrier)
-            self.all_sprites.add(barrier)
+        return [Barrier(int(WIDTH * p) - int(WIDTH * 0.05), barrier_y)
+                for p in (0.15, 0.38, 0.62, 0.85)]
+
+    def create_barriers(self):
+        for barrier in self.barrier_pool:
+            barrier.reset()
+        self.add_barriers()
+
+    def add_barriers(self):
+        self.barriers.add(self.barrier_pool)
+        self.all_sprites.add(self.barrier_pool)
+
+    def prepare_next_wave(self, deadline=None):
+        # Idle-time hook: build the formation and barriers of the level after
+        # this one ahead of time, so next_level only swaps them in. The build
+        # runs in small steps until deadline (a time.perf_counter() value)
+        # passes, and resumes on the next call; without a deadline, one step
+        # runs. It waits until the first frame of a new wave is out. Returns
+        # whether work is left
+        if self.level_cleared_at is not None or self.spare_level == self.level + 1:
+            return False
+        if self.wave_builder is None:
+            self.wave_builder = self.wave_steps(self.level + 1)
+        while deadline is None or time.perf_counter() < deadline:
+            if next(self.wave_builder, True):
+                self.wave_builder = None
+                return False
+            if deadline is None:
+                break
+        return True
+
+    def build_next_wave(self):
+        # Finish the build now, picking up any steps already done
+        builder = self.wave_builder or self.wave_steps(self.level + 1)
+        for _ in builder:
+            pass
+        self.wave_builder = None
+
+    def wave_steps(self, level):
+        # Yields None after each step of the build
+        self.spare_level = None
+        if self.spare_formation is None:
+            self.spare_formation = self.formation_class(level, self.rng, build=False)
+            yield
+        yield from self.spare_formation.reset_steps(level)
+        for barrier in self.spare_barriers:
+            yield
+            barrier.reset()
+        self.spare_level = level
 
     def next_level(self):
+        # Normally done already in idle time; otherwise it happens now
+        if self.spare_level != self.level + 1:
+            self.build_next_wave()
         self.level += 1
         self.lives += 1
 
@@ -272,136 +1627,519 @@ class Game:
                 sprite.kill()
         for sprite in self.bullets:
             sprite.kill()
-
-        # Create new formation
-        self.formation = AlienFormation(self.level)
-        self.all_sprites.add(self.formation.aliens)
-
-        # Recreate barriers
-        self.barriers.empty()
-        self.create_barriers()
+        if self.bullet_engine is not None:
+            self.bullet_engine.clear()
+
+        # Swap in the prepared wave; the finished one becomes the spare
+        self.formation, self.spare_formation = self.spare_formation, self.formation
+        self.formation.spatial_hash = self.spatial_hash
+        self.barrier_pool, self.spare_barriers = self.spare_barriers, self.barrier_pool
+        self.spare_level = None
+        self.prev_origin = None
+        self.all_sprites.add(self.formation.render_sprites())
+        self.add_barriers()
 
         self.player.invulnerable = 120
         self.alien_shoot_delay = max(600, 1500 - self.level * 100)
 
-    def update(self):
-        if self.paused or self.game_over:
+    def spawn_bullet(self, x, y, friendly):
+        # Returns whether the bullet was fired; the pool drops shots when full
+        if self.bullet_engine is not None:
+            speed = self.bullet_engine.speeds[friendly]
+            self.bullet_engine.spawn(x, y, 0.0, -speed if friendly else speed, friendly)
+            return True
+        bullet = self.bullet_pool.spawn(x, y, friendly, self.bullets, self.all_sprites)
+        if bullet is None:
+            return False
+        # A recycled bullet must not interpolate from its previous life
+        self.prev_positions.pop(bullet, None)
+        return True
+
+    def live_bullets(self, friendly):
+        if self.bullet_engine is not None:
+            return self.bullet_engine.live[friendly]
+        return self.bullet_pool.live[friendly]
+
+    def fire(self):
+        now = self.clock.get_ticks()
+        if self.player.can_shoot(self.live_bullets(True), now):
+            if self.spawn_bullet(self.player.rect.centerx, self.player.rect.top, True):
+                self.player.shoot(now)
+
+    def fire_aliens(self, origins):
+        if self.bullet_engine is not None:
+            xs, ys = zip(*origins)
+            self.bullet_engine.spawn_pattern(xs, ys, self.bullet_pattern, self.player.rect.center)
             return
+        for x, y in origins:
+            self.spawn_bullet(x, y, False)
 
-        self.all_sprites.update()
+    def update(self, inputs=NO_INPUT):
+        if self.paused or self.game_over:
+            return
+        self.frame += 1
+        self.clock.advance(FRAME_MS)
+        self.prev_positions = {sprite: (sprite.pos.x, sprite.pos.y)
+                               for group in (self.bullets, self.ufos) for sprite in group}
+        self.prev_positions[self.player] = (self.player.pos.x, self.player.pos.y)
+        self.prev_origin = pygame.math.Vector2(self.formation.origin)
+
+        # Aliens and barriers have no per-frame behaviour of their own
+        self.player.update(inputs)
+        self.bullets.update()
+        if self.bullet_engine is not None:
+            self.bullet_engine.update()
+        self.ufos.update()
+        if inputs.fire:
+            self.fire()
 
         # Update formation
         if self.formation.update():
             self.game_over = True
 
         # Alien shooting
-        now = pygame.time.get_ticks()
+        now = self.clock.get_ticks()
         if now - self.last_alien_shot > self.alien_shoot_delay:
-            shooter = self.formation.get_random_shooter()
-            if shooter:
+            if self.volley:
+                origins = self.formation.volley_origins()
+            else:
+                shot_origin = self.formation.get_shot_origin(self.player.rect.centerx)
+                origins = [shot_origin] if shot_origin else []
+            if origins:
                 self.last_alien_shot = now
-                bullet = Bullet(shooter.rect.centerx, shooter.rect.bottom, friendly=False)
-                self.bullets.add(bullet)
-                self.all_sprites.add(bullet)
+                self.fire_aliens(origins)
 
         # UFO spawning
         if now - self.last_ufo_spawn > self.ufo_spawn_delay and len(self.ufos) == 0:
             self.last_ufo_spawn = now
-            self.ufo_spawn_delay = random.randint(15000, 30000)
-            ufo = UFO()
-            self.ufos.add(ufo)
-            self.all_sprites.add(ufo)
-
-        # Collisions: Player bullets vs aliens
-        for bullet in self.bullets:
-            if bullet.friendly:
-                hits = pygame.sprite.spritecollide(bullet, self.formation.aliens, True)
-                if hits:
-                    bullet.kill()
-                    self.score += 10 * len(hits)
-
-        # Collisions: Player bullets vs UFO
-        for bullet in self.bullets:
-            if bullet.friendly:
-                hits = pygame.sprite.spritecollide(bullet, self.ufos, True)
-                for ufo in hits:
-                    bullet.kill()
-                    self.score += ufo.points
-
-        # Collisions: Bullets vs barriers
+            self.ufo_spawn_delay = self.rng.randint(15000, 30000)
+            if self.ufo is None:
+                self.ufo = UFO(self.rng)
+            else:
+                self.ufo.reset(self.rng)
+            self.ufos.add(self.ufo)
+            self.all_sprites.add(self.ufo)
+
+        # Broad phase: bring the spatial hash up to date with this tick's moves
+        spatial_hash = self.spatial_hash
+        spatial_hash.candidate_pairs = 0
+        spatial_hash.sync(self.ufos, "ufo")
+        spatial_hash.sync(self.barriers, "barrier")
+        spatial_hash.sync([self.player], "player")
+        self.formation.sync_hash()
+        self.formation.candidate_pairs = 0
+        bullet_count = len(self.bullets)
+        if self.bullet_engine is not None:
+            bullet_count += len(self.bullet_engine)
+        naive_pairs = bullet_count * (len(self.formation) + len(self.ufos)
+                                      + len(self.barriers) + 1)
+
+        # Collisions: one pass over the bullets through the collision matrix.
+        # Each bullet is tested along its whole move this tick; bullets whose
+        # swept rect touches no target rect of their side are skipped outright
+        targets = {True: self.target_rects(True), False: self.target_rects(False)}
         for bullet in self.bullets:
-            hits = pygame.sprite.spritecollide(bullet, self.barriers, False)
-            for barrier in hits:
-                barrier.hit()
+            rect = bullet.rect
+            prev = self.prev_positions.get(bullet)
+            if prev is None:
+                dx = dy = 0
+            else:
+                dx, dy = rect.x - round(prev[0]), rect.y - round(prev[1])
+            if rect.union(rect.move(-dx, -dy)).collidelist(targets[bullet.friendly]) < 0:
+                continue
+            if self.resolve_bullet(bullet, dx, dy):
                 bullet.kill()
+        if self.bullet_engine is not None:
+            self.bullet_engine.collide(self, targets)
+
+        stats = self.collision_stats
+        stats["frames"] += 1
+        stats["candidate_pairs"] += spatial_hash.candidate_pairs + self.formation.candidate_pairs
+        stats["naive_pairs"] += naive_pairs
 
-        # Collisions: Enemy bullets vs player
-        if self.player.invulnerable <= 0:
-            for bullet in self.bullets:
-                if not bullet.friendly and bullet.rect.colliderect(self.player.rect):
-                    bullet.kill()
-                    self.lives -= 1
-                    self.player.invulnerable = 120
-                    if self.lives <= 0:
-                        self.game_over = True
+        # Without a renderer the first frame of a wave is its first tick
+        if self.level_cleared_at is not None and self.renderer is None:
+            self.record_transition()
 
         # Check level complete
-        if len(self.formation.aliens) == 0:
+        if len(self.formation) == 0:
+            self.level_cleared_at = time.perf_counter()
             self.next_level()
 
-    def draw(self):
-        screen.fill(BLACK)
-        self.all_sprites.draw(screen)
-
-        # HUD
-        font = pygame.font.SysFont(None, int(HEIGHT * 0.04))
-        score_text = font.render(f"Score: {self.score}", True, WHITE)
-        lives_text = font.render(f"Lives: {self.lives}", True, WHITE)
-        level_text = font.render(f"Level: {self.level}", True, WHITE)
-
-        screen.blit(score_text, (int(WIDTH * 0.02), int(HEIGHT * 0.02)))
-        screen.blit(lives_text, (WIDTH - int(WIDTH * 0.15), int(HEIGHT * 0.02)))
-        screen.blit(level_text, (WIDTH // 2 - int(WIDTH * 0.04), int(HEIGHT * 0.02)))
-
-        if self.paused:
-            big_font = pygame.font.SysFont(None, int(HEIGHT * 0.08))
-            pause_text = big_font.render("PAUSED", True, WHITE)
-            rect = pause_text.get_rect(center=(WIDTH // 2, HEIGHT // 2))
-            screen.blit(pause_text, rect)
+    def record_transition(self):
+        elapsed = (time.perf_counter() - self.level_cleared_at) * 1000
+        self.level_cleared_at = None
+        stats = self.transition_stats
+        stats["count"] += 1
+        stats["total_ms"] += elapsed
+        stats["max_ms"] = max(stats["max_ms"], elapsed)
+
+    def resolve_bullet(self, bullet, dx, dy):
+        # Step the bullet along its move and apply the first rule that hits;
+        # the bullet's rect is left at the point of impact
+        rules = self.collision_rules[bullet.friendly]
+        for pos in sweep(bullet.rect, dx, dy):
+            bullet.rect.topleft = pos
+            for find, handle in rules:
+                hits = find(bullet)
+                if hits:
+                    handle(bullet, hits)
+                    return True
+        return False
 
-        if self.game_over:
-            big_font = pygame.font.SysFont(None, int(HEIGHT * 0.1))
-            small_font = pygame.font.SysFont(None, int(HEIGHT * 0.05))
+    def target_rects(self, friendly):
+        # Rects of everything bullets of one side can hit, for vectorized prefilters
+        rects = [barrier.rect for barrier in self.barriers]
+        if friendly:
+            if len(self.formation):
+                rects.append(self.formation.bounds())
+            rects.extend(ufo.rect for ufo in self.ufos)
+        elif self.player.invulnerable <= 0:
+            rects.append(self.player.rect)
+        return rects
+
+    # Collision targets: each returns what the bullet hit (falsy for nothing)
+    def find_alien(self, bullet):
+        return self.formation.collide(bullet)
+
+    def find_ufo(self, bullet):
+        return [ufo for ufo in self.spatial_hash.collide(bullet, "ufo")
+                if pygame.sprite.collide_mask(bullet, ufo)]
+
+    def find_barrier(self, bullet):
+        # Rect hits are confirmed against the eroded barrier masks
+        return [barrier for barrier in self.spatial_hash.collide(bullet, "barrier")
+                if barrier.overlap(bullet) is not None]
+
+    def find_player(self, bullet):
+        if self.player.invulnerable > 0:
+            return []
+        return [player for player in self.spatial_hash.collide(bullet, "player")
+                if pygame.sprite.collide_mask(bullet, player)]
+
+    # Collision handlers: apply the effect of a hit; the bullet is killed after
+    def bullet_hits_aliens(self, bullet, hits):
+        self.score += 10 * hits
+
+    def bullet_hits_ufo(self, bullet, ufos):
+        for ufo in ufos:
+            self.spatial_hash.remove(ufo)
+            ufo.kill()
+            self.score += ufo.points
+
+    def bullet_hits_barriers(self, bullet, barriers):
+        for barrier in barriers:
+            barrier.hit(bullet)
+            if not barrier.alive():
+                self.spatial_hash.remove(barrier)
+
+    def bullet_hits_player(self, bullet, hits):
+        self.lives -= 1
+        self.player.invulnerable = 120
+        if self.lives <= 0:
+            self.game_over = True
 
-            game_over_text = big_font.render("GAME OVER", True, RED)
-            score_text = small_font.render(f"Final Score: {self.score}", True, WHITE)
-            restart_text = small_font.render("Press R to Restart or ESC to Quit", True, WHITE)
+    def draw(self, alpha=1.0):
+        if self.renderer is None:
+            return
+        # Nothing moves while paused or over, so draw the current positions
+        if self.paused or self.game_over:
+            alpha = 1.0
+        # Draw sprites between their previous and current tick positions
+        moved = []
+        if alpha < 1.0:
+            for sprite, (x, y) in self.prev_positions.items():
+                pos = sprite.pos
+                if pos.x != x or pos.y != y:
+                    rect = sprite.rect
+                    moved.append((rect, rect.topleft))
+                    rect.topleft = (round(x + (pos.x - x) * alpha),
+                                    round(y + (pos.y - y) * alpha))
+            # Aliens follow the interpolated formation origin
+            origin = self.formation.origin
+            if self.prev_origin is not None and self.prev_origin != origin:
+                drawn = self.prev_origin.lerp(origin, alpha)
+                dx = round(drawn.x) - round(origin.x)
+                dy = round(drawn.y) - round(origin.y)
+                self.formation.set_draw_offset(dx, dy)
+        self.draw_alpha = alpha
+        self.renderer.render(self)
+        for rect, pos in moved:
+            rect.topleft = pos
+        self.formation.set_draw_offset(0, 0)
+        if self.level_cleared_at is not None:
+            self.record_transition()
+
+    def draw_layers(self, surface):
+        # Everything drawn on top of all_sprites: engine bullets and the HUD
+        rects = []
+        if self.bullet_engine is not None:
+            rects += self.bullet_engine.draw(surface, self.draw_alpha)
+        return rects + self.hud.draw(surface, self)
+
+# Heads-up display: fonts are loaded once per resolution and each text slot
+# keeps its rendered surface until the string it shows changes
+font_cache = {}
+
+def get_font(scale):
+    key = (scale, HEIGHT)
+    font = font_cache.get(key)
+    if font is None:
+        font = pygame.font.SysFont(None, int(HEIGHT * scale))
+        font_cache[key] = font
+    return font
+
+# Glyph atlas: the characters used by the HUD are rendered once into a single
+# surface and text is drawn as one batched blits call of glyph subsurfaces
+HUD_STRINGS = ["Score: ", "Lives: ", "Level: ", "PAUSED", "GAME OVER",
+               "Final Score: ", "Press R to Restart or ESC to Quit"]
+GLYPH_CHARSET = "0123456789-" + "".join(sorted(set("".join(HUD_STRINGS))))
+
+class GlyphAtlas:
+    def __init__(self, font, color, charset=GLYPH_CHARSET):
+        rendered = [(char, font.render(char, True, color)) for char in charset]
+        self.height = font.get_height()
+        self.image = pygame.Surface((sum(g.get_width() for _, g in rendered), self.height),
+                                    pygame.SRCALPHA)
+        self.glyphs = {}
+        x = 0
+        for char, glyph in rendered:
+            # RGBA_MAX onto the transparent atlas copies the glyph's alpha unchanged
+            self.image.blit(glyph, (x, 0), special_flags=pygame.BLEND_RGBA_MAX)
+            x += glyph.get_width()
+        if pygame.display.get_surface() is not None:
+            self.image = self.image.convert_alpha()
+        x = 0
+        for char, glyph in rendered:
+            width = glyph.get_width()
+            self.glyphs[char] = self.image.subsurface((x, 0, width, self.height))
+            x += width
+        self.space = self.glyphs[" "].get_width() if " " in self.glyphs else self.height // 3
+
+    def size(self, text):
+        glyphs = self.glyphs
+        width = sum(glyphs[c].get_width() if c in glyphs else self.space for c in text)
+        return width, self.height
+
+    def draw(self, surface, text, **anchor):
+        rect = pygame.Rect((0, 0), self.size(text))
+        for name, value in anchor.items():
+            setattr(rect, name, value)
+        glyphs = self.glyphs
+        x, y = rect.topleft
+        batch = []
+        for char in text:
+            glyph = glyphs.get(char)
+            if glyph is None:
+                x += self.space
+                continue
+            batch.append((glyph, (x, y)))
+            x += glyph.get_width()
+        surface.blits(batch, doreturn=False)
+        return rect
+
+glyph_atlas_cache = {}
+
+def get_glyph_atlas(scale, color):
+    key = (scale, color, HEIGHT)
+    atlas = glyph_atlas_cache.get(key)
+    if atlas is None:
+        atlas = GlyphAtlas(get_font(scale), color)
+        glyph_atlas_cache[key] = atlas
+    return atlas
+
+class HUD:
+    def __init__(self, use_atlas=USE_GLYPH_ATLAS):
+        self.use_atlas = use_atlas
+        self.slots = {}
+
+    def text(self, slot, text, scale, color):
+        key = (text, scale, color, HEIGHT)
+        cached = self.slots.get(slot)
+        if cached is None or cached[0] != key:
+            cached = (key, get_font(scale).render(text, True, color))
+            self.slots[slot] = cached
+        return cached[1]
+
+    def draw_text(self, surface, slot, text, scale, color, **anchor):
+        if self.use_atlas:
+            return get_glyph_atlas(scale, color).draw(surface, text, **anchor)
+        image = self.text(slot, text, scale, color)
+        return surface.blit(image, image.get_rect(**anchor))
+
+    def draw(self, surface, game):
+        top = int(HEIGHT * 0.02)
+        rects = [
+            self.draw_text(surface, "score", f"Score: {game.score}", 0.04, WHITE,
+                           topleft=(int(WIDTH * 0.02), top)),
+            self.draw_text(surface, "lives", f"Lives: {game.lives}", 0.04, WHITE,
+                           topleft=(WIDTH - int(WIDTH * 0.15), top)),
+            self.draw_text(surface, "level", f"Level: {game.level}", 0.04, WHITE,
+                           topleft=(WIDTH // 2 - int(WIDTH * 0.04), top)),
+        ]
+
+        if game.paused:
+            rects.append(self.draw_text(surface, "paused", "PAUSED", 0.08, WHITE,
+                                        center=(WIDTH // 2, HEIGHT // 2)))
+
+        if game.game_over:
+            rects.append(self.draw_text(surface, "game_over", "GAME OVER", 0.1, RED,
+                                        center=(WIDTH // 2, HEIGHT // 2 - int(HEIGHT * 0.05))))
+            rects.append(self.draw_text(surface, "final_score", f"Final Score: {game.score}",
+                                        0.05, WHITE,
+                                        center=(WIDTH // 2, HEIGHT // 2 + int(HEIGHT * 0.05))))
+            rects.append(self.draw_text(surface, "restart", "Press R to Restart or ESC to Quit",
+                                        0.05, WHITE,
+                                        center=(WIDTH // 2, HEIGHT // 2 + int(HEIGHT * 0.13))))
+        return rects
+
+# Renderers: draw the game state and push the frame to the display
+class FullRenderer:
+    def render(self, game):
+        screen.fill(BLACK)
+        game.formation.draw_below(screen)
+        game.all_sprites.draw(screen)
+        game.draw_layers(screen)
+        pygame.display.flip()
 
-            rect1 = game_over_text.get_rect(center=(WIDTH // 2, HEIGHT // 2 - int(HEIGHT * 0.05)))
-            rect2 = score_text.get_rect(center=(WIDTH // 2, HEIGHT // 2 + int(HEIGHT * 0.05)))
-            rect3 = restart_text.get_rect(center=(WIDTH // 2, HEIGHT // 2 + int(HEIGHT * 0.13)))
+class DirtyRenderer:
+    def __init__(self, fallback_ratio=DIRTY_FALLBACK_RATIO):
+        self.fallback_ratio = fallback_ratio
+        self.background = None
+        self.sprites = None
+        self.formation = None
+        self.layer_rects = []
+
+    def render(self, game):
+        # A new sprite group (reset), formation (new wave) or resolution means
+        # the screen is stale
+        if self.background is None or self.background.get_size() != screen.get_size():
+            self.background = pygame.Surface(screen.get_size()).convert()
+            self.background.fill(BLACK)
+            self.sprites = None
+        if game.all_sprites is not self.sprites or game.formation is not self.formation:
+            self.sprites = game.all_sprites
+            self.formation = game.formation
+            screen.blit(self.background, (0, 0))
+            game.formation.draw_below(screen)
+            game.all_sprites.draw(screen)
+            self.layer_rects = game.draw_layers(screen)
+            pygame.display.flip()
+            return
 
-            screen.blit(game_over_text, rect1)
-            screen.blit(score_text, rect2)
-            screen.blit(restart_text, rect3)
+        # Erase last frame's layers and sprites, let the formation repaint what
+        # changed under them, then draw the new frame on top
+        erased = list(self.layer_rects)
+        erased.extend(rect for rect in game.all_sprites.spritedict.values() if rect)
+        erased.extend(game.all_sprites.lostsprites)
+        for rect in self.layer_rects:
+            screen.blit(self.background, rect, rect)
+        game.all_sprites.clear(screen, self.background)
+        dirty = game.formation.draw_dirty(screen, self.background, erased)
+        dirty.extend(game.all_sprites.draw(screen))
+        layer_rects = game.draw_layers(screen)
+        dirty.extend(self.layer_rects)
+        dirty.extend(layer_rects)
+        self.layer_rects = layer_rects
+
+        dirty_area = sum(rect.width * rect.height for rect in dirty)
+        if dirty_area > self.fallback_ratio * screen.get_width() * screen.get_height():
+            pygame.display.flip()
+        else:
+            pygame.display.update(dirty)
+
+# Headless simulation: steps the game core as fast as the CPU allows
+def autopilot(game):
+    # Simple scripted player: chase the nearest alien column and keep firing
+    target_x = game.formation.nearest_alien_x(game.player.rect.centerx)
+    if target_x is None:
+        return InputState(fire=True)
+    dx = target_x - game.player.rect.centerx
+    return InputState(left=dx < -game.player.speed, right=dx > game.player.speed, fire=True)
+
+def simulate(frames, policy=autopilot, game=None, observer=None, seed=None,
+             formation_class=AlienFormation, **options):
+    if game is None:
+        if not display_ready:
+            init_display("headless")
+        game = Game(clock=SimClock(), seed=seed, formation_class=formation_class, **options)
+    for _ in range(frames):
+        if game.game_over:
+            break
+        game.update(policy(game) if policy else NO_INPUT)
+        game.prepare_next_wave()
+        if observer is not None:
+            observer(game)
+    return game
+
+def run_headless(frames, seed=None, formation_class=AlienFormation, **options):
+    start = time.perf_counter()
+    game = simulate(frames, seed=seed, formation_class=formation_class, **options)
+    elapsed = time.perf_counter() - start
+    print(f"Simulated {game.frame} frames in {elapsed:.2f} s "
+          f"({game.frame / elapsed:.0f} frames/s): score {game.score}, "
+          f"level {game.level}, lives {game.lives}, game over {game.game_over}")
+    stats = game.collision_stats
+    if stats["frames"]:
+        print(f"Collision pairs per frame: {stats['candidate_pairs'] / stats['frames']:.1f} "
+              f"tested vs {stats['naive_pairs'] / stats['frames']:.1f} brute force")
+    stats = game.transition_stats
+    if stats["count"]:
+        print(f"Level transitions: {stats['count']}, level clear to first frame "
+              f"{stats['total_ms'] / stats['count']:.2f} ms mean, {stats['max_ms']:.2f} ms max")
 
 # Main game loop
-def main():
-    game = Game()
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Space Invaders")
+    parser.add_argument("--windowed", action="store_true", help="run in a window")
+    parser.add_argument("--headless", type=int, metavar="FRAMES",
+                        help="simulate FRAMES frames without a display and print the result")
+    parser.add_argument("--seed", type=int, help="random seed for a reproducible game")
+    parser.add_argument("--formation", choices=sorted(FORMATION_BACKENDS), default="sprite",
+                        help="alien formation backend")
+    parser.add_argument("--formation-size", type=int, nargs=2, metavar=("ROWS", "COLS"),
+                        help="override the formation size, e.g. for stress tests")
+    parser.add_argument("--shot-mode", choices=ALIEN_SHOT_MODES, default=ALIEN_SHOT_MODE,
+                        help="how the aliens pick which column fires")
+    parser.add_argument("--bullets", choices=sorted(BULLET_ENGINES), default="sprite",
+                        help="bullet backend")
+    parser.add_argument("--bullet-pattern", choices=BULLET_PATTERNS, default=BULLET_PATTERN,
+                        help="alien fire pattern (angled shots need --bullets numpy)")
+    parser.add_argument("--volley", action="store_true",
+                        help="every living alien column fires at once")
+    args = parser.parse_args(argv)
+
+    rows, cols = args.formation_size or (None, None)
+    formation_class = functools.partial(FORMATION_BACKENDS[args.formation], rows=rows, cols=cols,
+                                        shot_mode=args.shot_mode)
+    options = dict(bullet_engine=BULLET_ENGINES[args.bullets],
+                   bullet_pattern=args.bullet_pattern, volley=args.volley)
+
+    if args.headless is not None:
+        init_display("headless")
+        run_headless(args.headless, args.seed, formation_class, **options)
+        return
+
+    init_display("windowed" if args.windowed else "fullscreen")
+    clock = pygame.time.Clock()
+    renderer = DirtyRenderer() if USE_DIRTY_RENDERER else FullRenderer()
+    game = Game(renderer, clock=SimClock(), seed=args.seed, formation_class=formation_class,
+                **options)
     running = True
+    accumulator = 0.0
+    fire = False
 
     while running:
-        clock.tick(FPS)
+        accumulator = min(accumulator + clock.tick(MAX_RENDER_FPS),
+                          MAX_CATCHUP_STEPS * FRAME_MS)
+        frame_start = time.perf_counter()
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_SPACE and not game.game_over and not game.paused:
-                    if game.player.shoot(game.bullets):
-                        bullet = Bullet(game.player.rect.centerx, game.player.rect.top)
-                        game.bullets.add(bullet)
-                        game.all_sprites.add(bullet)
+                    fire = True
                 elif event.key == pygame.K_p and not game.game_over:
                     game.paused = not game.paused
                 elif event.key == pygame.K_r and game.game_over:
@@ -409,12 +2147,31 @@ def main():
                 elif event.key == pygame.K_ESCAPE:
                     running = False
 
-        game.update()
-        game.draw()
-        pygame.display.flip()
+        # A frozen game keeps no backlog of time, so it resumes without a burst
+        if game.paused or game.game_over:
+            accumulator = 0.0
+
+        # A shot stays queued until a simulation tick consumes it
+        while accumulator >= FRAME_MS:
+            game.update(read_keyboard(fire))
+            fire = False
+            accumulator -= FRAME_MS
+        game.draw(accumulator / FRAME_MS)
+        # Build the next wave in whatever is left of this frame's budget.
+        # Uncapped, there is no idle time, so it takes one step per frame
+        if MAX_RENDER_FPS:
+            game.prepare_next_wave(frame_start + 1 / MAX_RENDER_FPS - IDLE_MARGIN_MS / 1000)
+        else:
+            game.prepare_next_wave()
+
+        if startup_times["first_frame_ms"] is None:
+            startup_times["first_frame_ms"] = (time.perf_counter() - IMPORT_START) * 1000
+            report_startup()
 
     pygame.quit()
     sys.exit()
 
+startup_times["import_ms"] = (time.perf_counter() - IMPORT_START) * 1000
+
 if __name__ == "__main__":
     main()